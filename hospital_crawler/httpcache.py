@@ -0,0 +1,150 @@
+# HTTP cache cho môi trường dev và các lần chạy lại
+#
+# Dựa trên HttpCacheMiddleware của Scrapy, bật bằng HTTPCACHE_ENABLED = True
+# hoặc `python -m hospital_crawler.run --cache`.
+#
+#   - CompressedCacheStorage: mỗi response là một file nén gzip duy nhất,
+#     chia shard theo fingerprint: <HTTPCACHE_DIR>/<spider>/ab/cd/abcd....gz
+#   - SiteTTLPolicy: TTL theo category / theo sitemap (request.meta['cache_ttl'],
+#     do spider tính từ SITES[<site>]["cache_ttl"]). Hết hạn thì gửi request có
+#     điều kiện (If-None-Match / If-Modified-Since), server trả 304 thì dùng lại cache.
+#   - RevalidatingCacheMiddleware: sau khi server trả 304, làm mới timestamp của
+#     bản cache để TTL được tính lại từ lần xác nhận này (HttpCacheMiddleware của
+#     một số bản Scrapy, vd 2.13, chỉ trả về bản cũ mà không ghi lại).
+#
+# Response lấy từ cache được trả về ngay trong process_request, trước khi
+# request vào downloader slot, nên không phải chờ DOWNLOAD_DELAY.
+
+import gzip
+import os
+import pickle
+import time
+
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.extensions.httpcache import DummyPolicy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+
+class CompressedCacheStorage:
+    """Một file gzip (pickle) cho mỗi response, shard 2 cấp theo fingerprint"""
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings["HTTPCACHE_DIR"], createdir=True)
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.compresslevel = settings.getint("HTTPCACHE_GZIP_LEVEL", 6)
+        self._fingerprinter = None
+
+    def open_spider(self, spider):
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        spider.logger.debug(f"Using compressed HTTP cache storage in {self.cachedir}")
+
+    def close_spider(self, spider):
+        pass
+
+    def retrieve_response(self, spider, request):
+        path = self._get_request_path(spider, request)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rb") as f:
+            entry = pickle.load(f)
+
+        # HTTPCACHE_EXPIRATION_SECS là giới hạn cứng, TTL chi tiết do policy quyết định
+        if 0 < self.expiration_secs < time.time() - entry["timestamp"]:
+            return None
+
+        request.meta["cache_timestamp"] = entry["timestamp"]
+        headers = Headers(entry["headers"])
+        respcls = responsetypes.from_args(headers=headers, url=entry["url"], body=entry["body"])
+        return respcls(url=entry["url"], headers=headers, status=entry["status"], body=entry["body"])
+
+    def store_response(self, spider, request, response):
+        path = self._get_request_path(spider, request)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "url": response.url,
+            "status": response.status,
+            "headers": dict(response.headers),
+            "body": response.body,
+            "timestamp": time.time(),
+        }
+        self._write_entry(path, entry)
+
+    def touch_response(self, spider, request):
+        """Làm mới timestamp của bản cache (sau 304), không đổi nội dung"""
+        path = self._get_request_path(spider, request)
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, "rb") as f:
+            entry = pickle.load(f)
+        # Đã được ghi lại sau lần đọc này (middleware của Scrapy tự làm mới) -> bỏ qua
+        if entry["timestamp"] > request.meta.get("cache_timestamp", 0):
+            return
+        entry["timestamp"] = time.time()
+        self._write_entry(path, entry)
+
+    def _write_entry(self, path, entry):
+        # Ghi file tạm rồi thay thế để không bao giờ đọc phải file ghi dở
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=self.compresslevel) as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _get_request_path(self, spider, request):
+        key = self._fingerprinter.fingerprint(request).hex()
+        return os.path.join(self.cachedir, spider.name, key[0:2], key[2:4], f"{key}.gz")
+
+
+class SiteTTLPolicy(DummyPolicy):
+    """
+    Cache mọi response hợp lệ (bỏ qua Cache-Control của server), hết hạn theo
+    request.meta['cache_ttl'] (giây, 0 = không hết hạn), mặc định HTTPCACHE_DEFAULT_TTL.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.default_ttl = settings.getint("HTTPCACHE_DEFAULT_TTL", 0)
+        self.revalidate = settings.getbool("HTTPCACHE_REVALIDATE", True)
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        ttl = request.meta.get("cache_ttl", self.default_ttl)
+        age = time.time() - request.meta.get("cache_timestamp", 0)
+        if not ttl or age < ttl:
+            return True
+        if self.revalidate:
+            self._set_conditional_validators(request, cachedresponse)
+        return False
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        # 304 Not Modified -> dùng lại bản trong cache,
+        # timestamp được làm mới bởi RevalidatingCacheMiddleware
+        return response.status == 304
+
+    @staticmethod
+    def _set_conditional_validators(request, cachedresponse):
+        if b"ETag" in cachedresponse.headers:
+            request.headers[b"If-None-Match"] = cachedresponse.headers[b"ETag"]
+        if b"Last-Modified" in cachedresponse.headers:
+            request.headers[b"If-Modified-Since"] = cachedresponse.headers[b"Last-Modified"]
+
+
+class RevalidatingCacheMiddleware(HttpCacheMiddleware):
+    """
+    HttpCacheMiddleware + làm mới timestamp của bản cache khi server xác nhận
+    bằng 304, nếu không bản cache sẽ bị coi là hết hạn (và gửi request có điều
+    kiện) ở mọi lần chạy sau dù nội dung không đổi.
+    """
+
+    def process_response(self, request, response, spider=None):
+        cachedresponse = request.meta.get("cached_response")
+        # Bản Scrapy mới không truyền spider (và cảnh báo nếu truyền vào)
+        if spider is None:
+            result = super().process_response(request, response)
+        else:
+            result = super().process_response(request, response, spider)
+        if response.status == 304 and cachedresponse is not None and result is cachedresponse:
+            touch = getattr(self.storage, "touch_response", None)
+            if touch is not None:
+                touch(spider or self.crawler.spider, request)
+        return result
@@ -10,3 +10,44 @@ class HospitalCrawlerItem(scrapy.Item):
     # define the fields for your item here like:
     # name = scrapy.Field()
     pass
+
+
+class HospitalArticleItem(scrapy.Item):
+    """
+    Một bài viết đã được tách thành các trường có cấu trúc.
+
+    sections: list các dict
+        {
+            "heading": "Triệu chứng" | None,   # None = phần mở đầu trước heading đầu tiên
+            "level": 2,                        # 2 = <h2>, 3 = <h3>, 0 = phần mở đầu
+            "paragraphs": ["...", ...],
+            "list_items": ["...", ...],
+        }
+    """
+    url = scrapy.Field()
+    site = scrapy.Field()
+    category = scrapy.Field()
+    slug = scrapy.Field()
+
+    title = scrapy.Field()
+    sections = scrapy.Field()
+    updated_at = scrapy.Field()
+    author = scrapy.Field()
+    reviewer = scrapy.Field()
+
+    page_content = scrapy.Field()
+    informations = scrapy.Field()  # {'full_info': <text>} - output dạng text như cũ
+    crawled_at = scrapy.Field()
+    status = scrapy.Field()
+
+    # Do GoogleDrivePipeline gán
+    uploaded_files = scrapy.Field()
+    upload_error = scrapy.Field()
+
+
+# Các trường được ghi ra file structured (JSON một dòng), bỏ HTML/text thô
+STRUCTURED_FIELDS = (
+    "url", "site", "category", "slug",
+    "title", "updated_at", "author", "reviewer", "crawled_at",
+    "sections",
+)
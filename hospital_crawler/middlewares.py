@@ -3,7 +3,10 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import time
+
 from scrapy import signals
+from scrapy.exceptions import CloseSpider, IgnoreRequest, NotConfigured
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
@@ -98,3 +101,74 @@ class HospitalCrawlerDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class RunBudgetMiddleware:
+    """
+    Giới hạn một lần chạy theo thời gian, số item, số byte tải về và số lần gọi Drive API.
+
+    Khi vượt ngân sách: không gửi request mới nữa (bỏ qua phần còn lại trong
+    hàng đợi), các download/upload đang chạy vẫn được hoàn tất, sau đó spider
+    đóng với reason "budget_<loại>" và lưu state như bình thường. Các URL bị
+    bỏ qua chưa được đánh dấu visited nên lần chạy sau sẽ crawl tiếp.
+    Đây là giới hạn mềm: các request đã vào downloader (tối đa CONCURRENT_REQUESTS)
+    vẫn chạy xong. Giá trị 0 = không giới hạn.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.stats = crawler.stats
+        self.limits = {
+            "seconds": settings.getfloat("RUN_BUDGET_SECONDS", 0),
+            "items": settings.getint("RUN_BUDGET_ITEMS", 0),
+            "bytes": settings.getint("RUN_BUDGET_BYTES", 0),
+            "drive_calls": settings.getint("RUN_BUDGET_DRIVE_CALLS", 0),
+        }
+        if not any(self.limits.values()):
+            raise NotConfigured
+        self.started_at = None
+        self.exhausted = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_idle, signal=signals.spider_idle)
+        return s
+
+    def usage(self):
+        return {
+            "seconds": time.monotonic() - self.started_at if self.started_at else 0,
+            "items": self.stats.get_value("item_scraped_count", 0),
+            "bytes": self.stats.get_value("downloader/response_bytes", 0),
+            "drive_calls": self.stats.get_value("drive/api_calls", 0),
+        }
+
+    def check(self, spider):
+        """Trả về loại ngân sách đã vượt (hoặc None)"""
+        if self.exhausted:
+            return self.exhausted
+        usage = self.usage()
+        for kind, limit in self.limits.items():
+            if limit and usage[kind] >= limit:
+                self.exhausted = kind
+                self.stats.set_value("budget/exhausted", kind)
+                spider.logger.warning(
+                    f"⏱️ Run budget '{kind}' reached ({usage[kind]:.0f}/{limit}). "
+                    f"Draining in-flight work, no new requests will be sent."
+                )
+                return kind
+        return None
+
+    def process_request(self, request, spider):
+        if self.check(spider):
+            self.stats.inc_value("budget/skipped_requests")
+            raise IgnoreRequest(f"Run budget '{self.exhausted}' exhausted")
+        return None
+
+    def spider_opened(self, spider):
+        self.started_at = time.monotonic()
+
+    def spider_idle(self, spider):
+        if self.check(spider):
+            raise CloseSpider(f"budget_{self.exhausted}")
@@ -8,22 +8,41 @@
 from itemadapter import ItemAdapter
 import os
 import io
-import re
-
-from google.oauth2 import service_account
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseUpload
+import json
+
 from scrapy.exceptions import DropItem
-from google.auth.transport.requests import Request
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThread
+
+# Các thư viện Google (googleapiclient, google_auth_oauthlib...) được import
+# lazily ở lần upload đầu tiên: `scrapy list`, dry run, test không phải trả chi phí import.
+
+from hospital_crawler.items import STRUCTURED_FIELDS
+from hospital_crawler.profiling import get_profiler, profiled
+from hospital_crawler.sites import get_site, DEFAULT_SITE
+
+
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.file']
+
+_DRIVE_DISCOVERY_DOC = None
+
+
+def _drive_discovery_document():
+    """Discovery document của Drive v3 (bản tĩnh đi kèm googleapiclient), parse một lần cho cả tiến trình"""
+    global _DRIVE_DISCOVERY_DOC
+    if _DRIVE_DISCOVERY_DOC is None:
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = get_static_doc('drive', 'v3')
+        _DRIVE_DISCOVERY_DOC = json.loads(document) if document else None
+    return _DRIVE_DISCOVERY_DOC
 
 
 class GoogleDrivePipeline:
     """
     Pipeline để upload scraped data lên Google Drive
-    Tổ chức theo cấu trúc thư mục: root_folder/category/files
+    Tổ chức theo cấu trúc thư mục: root_folder/[site_folder/]category/files
     """
     
     def __init__(self, oauth_key_file, oauth_token_file=None, parent_folder_id=None):
@@ -31,78 +50,140 @@ class GoogleDrivePipeline:
         self.oauth_token_file = oauth_token_file
         self.parent_folder_id = parent_folder_id
         self.drive_service = None
+        self.site = None
+        self.stats = None
+        self.profiler = None
+        self._ready = False  # chỉ bật trên reactor thread, khi service + folder đã sẵn sàng
+        self._connecting = None  # Deferred của lần xác thực đầu tiên
+        self._connect_error = None
+        self._waiting = []  # Deferred của các item chờ xác thực xong
         self.folder_cache = {}  # Cache để lưu folder IDs
         self.upload_stats = {
             'total_items': 0,
             'successful_uploads': 0,
             'failed_uploads': 0,
             'html_files': 0,
+            'txt_files': 0,
             'json_files': 0
         }
         
     @classmethod
     def from_crawler(cls, crawler):
         """Khởi tạo pipeline từ Scrapy settings"""
-        return cls(
+        pipeline = cls(
             oauth_key_file=crawler.settings.get('GOOGLE_OAUTH_KEY_FILE'),
             parent_folder_id=crawler.settings.get('GOOGLE_DRIVE_PARENT_FOLDER_ID'),
             oauth_token_file=crawler.settings.get('GOOGLE_OAUTH_TOKEN_FILE')
         )
+        pipeline.stats = crawler.stats
+        pipeline.profiler = get_profiler(crawler)
+        return pipeline
     
     def open_spider(self, spider):
-        """Khởi tạo khi spider bắt đầu"""
-        try:
-            # Kiểm tra file service account
-            if not os.path.exists(self.oauth_key_file):
-                raise Exception(f"Service account file not found: {self.oauth_key_file}")
-            
-            # Xác thực với Google Drive API
-            # credentials = service_account.Credentials.from_service_account_file(
-            #     self.service_account_file,
-            #     scopes=['https://www.googleapis.com/auth/drive.file']
-            # )
-
-            credentials = None
-
-            # Khởi tạo credentials bằng file token
-            if self.oauth_token_file and  os.path.exists(self.oauth_token_file):
-                credentials = Credentials.from_authorized_user_file(
-                    self.oauth_token_file, 
-                    scopes = ['https://www.googleapis.com/auth/drive.file']
+        """
+        Khởi tạo khi spider bắt đầu (chưa xác thực, chờ tới item đầu tiên).
+        Thiếu file key thì dừng ngay như trước, không tải trang nào về.
+        """
+        self.site = getattr(spider, 'site', None) or get_site(DEFAULT_SITE)
+
+        # Chỉ kiểm tra file trên đĩa, không gọi mạng
+        if not self.oauth_key_file or not os.path.exists(self.oauth_key_file):
+            spider.logger.error(f"❌ Failed to initialize Google Drive: Service account file not found: {self.oauth_key_file}")
+            raise DropItem(f"Failed to initialize Google Drive: Service account file not found: {self.oauth_key_file}")
+
+    def _connect(self, spider):
+        """
+        Xác thực + khởi tạo Drive service, chạy trong thread để không chặn reactor.
+        Chỉ dùng biến cục bộ, trả về (drive_service, parent_folder_id); _connected
+        gán lại lên pipeline trên reactor thread.
+        """
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from googleapiclient.discovery import build, build_from_document
+
+        # Kiểm tra file service account
+        if not os.path.exists(self.oauth_key_file):
+            raise Exception(f"Service account file not found: {self.oauth_key_file}")
+
+        # Xác thực với Google Drive API
+        # credentials = service_account.Credentials.from_service_account_file(
+        #     self.service_account_file,
+        #     scopes=['https://www.googleapis.com/auth/drive.file']
+        # )
+
+        credentials = None
+
+        # Khởi tạo credentials bằng file token
+        if self.oauth_token_file and  os.path.exists(self.oauth_token_file):
+            credentials = Credentials.from_authorized_user_file(
+                self.oauth_token_file,
+                scopes = DRIVE_SCOPES
+                )
+
+        # Khởi tạo credential bằng file key (yêu cầu xác thực)
+        if not credentials or not credentials.valid:
+            if credentials and credentials.expired and credentials.refresh_token:
+                credentials.refresh(request=Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    self.oauth_key_file, DRIVE_SCOPES
                     )
-            
-            # Khởi tạo credential bằng file key (yêu cầu xác thực)
-            if not credentials or not credentials.valid:
-                if credentials and credentials.expired and credentials.refresh_token:
-                    credentials.refresh(request=Request())
-                else:
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        self.oauth_key_file, ['https://www.googleapis.com/auth/drive.file']
-                        ) 
-
-                    credentials = flow.run_local_server(port=0)
-
-                with open("token.json", "w") as token:
-                    token.write(credentials.to_json())      
-            
-            self.drive_service = build('drive', 'v3', credentials=credentials)
-            
-            # Test connection
-            about = self.drive_service.about().get(fields="user").execute()
-            user = about.get('user', {})
-            spider.logger.info(f"🔐 Authenticated as: {user.get('displayName', 'Unknown')} ({user.get('emailAddress', 'No email')})")
-            
-            # Tạo hoặc lấy root folder
-            if not self.parent_folder_id:
-                self.parent_folder_id = self._get_or_create_folder("scraped_hospital_data", None)
-            
-            spider.logger.info(f"✅ Google Drive Pipeline initialized")
-            spider.logger.info(f"📁 Root folder ID: {self.parent_folder_id}")
-            
-        except Exception as e:
-            spider.logger.error(f"❌ Failed to initialize Google Drive: {e}")
-            raise DropItem(f"Failed to initialize Google Drive: {e}")
-    
+
+                credentials = flow.run_local_server(port=0)
+
+            with open(self.oauth_token_file or "token.json", "w") as token:
+                token.write(credentials.to_json())
+
+        # Dùng discovery document đã cache, không gọi mạng
+        document = _drive_discovery_document()
+        if document:
+            drive_service = build_from_document(document, credentials=credentials)
+        else:
+            drive_service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
+
+        # Test connection
+        about = self._execute(drive_service.about().get(fields="user"))
+        user = about.get('user', {})
+        spider.logger.info(f"🔐 Authenticated as: {user.get('displayName', 'Unknown')} ({user.get('emailAddress', 'No email')})")
+
+        # Tạo hoặc lấy root folder
+        parent_folder_id = self.parent_folder_id
+        if not parent_folder_id:
+            parent_folder_id = self._get_or_create_folder("scraped_hospital_data", None, drive_service)
+
+        # Mỗi site (trừ site cũ) có folder riêng dưới root để tránh trùng category
+        if self.site.drive_folder:
+            parent_folder_id = self._get_or_create_folder(self.site.drive_folder, parent_folder_id, drive_service)
+
+        return drive_service, parent_folder_id
+
+    def _connected(self, result, spider):
+        """Xác thực xong (reactor thread): bật service rồi upload các item đang chờ"""
+        self.drive_service, self.parent_folder_id = result
+        self._ready = True
+        spider.logger.info(f"✅ Google Drive Pipeline initialized")
+        spider.logger.info(f"📁 Root folder ID: {self.parent_folder_id}")
+
+        spider.logger.info(f"📤 Uploading {len(self._waiting)} queued item(s)")
+        self._release_waiting()
+
+    def _connect_failed(self, failure, spider):
+        self._connect_error = failure.value
+        spider.logger.error(f"❌ Failed to initialize Google Drive: {failure.value}")
+        # Các item đang chờ đi tiếp, _process_item ghi upload_error cho từng item
+        self._release_waiting()
+
+        # Không upload được thì dừng crawl như trước (không tải trang vô ích)
+        crawler = getattr(spider, 'crawler', None)
+        if crawler is not None and crawler.engine is not None:
+            crawler.engine.close_spider(spider, 'drive_unavailable')
+
+    def _release_waiting(self):
+        waiting, self._waiting = self._waiting, []
+        for d in waiting:
+            d.callback(None)
+
     def close_spider(self, spider):
         """Cleanup khi spider kết thúc"""
         spider.logger.info("🔒 Google Drive Pipeline closing...")
@@ -116,6 +197,7 @@ class GoogleDrivePipeline:
         spider.logger.info(f"❌ Failed uploads: {self.upload_stats['failed_uploads']}")
         spider.logger.info(f"🌐 HTML files uploaded: {self.upload_stats['html_files']}")
         spider.logger.info(f"📝 TXT files uploaded: {self.upload_stats['txt_files']}")
+        spider.logger.info(f"🧩 JSON files uploaded: {self.upload_stats['json_files']}")
         spider.logger.info(f"📁 Categories created: {len(self.folder_cache)}")
         spider.logger.info(f"🏷️ Category folders: {', '.join([k.split('_', 1)[-1] for k in self.folder_cache.keys() if '_' in k])}")
         spider.logger.info("="*50)
@@ -130,11 +212,35 @@ class GoogleDrivePipeline:
                 "status": f"error: {str(e)}"
             }
     """
-    def process_item(self, item, spider):
-        """Xử lý từng item được scrapy trả về"""
+    async def process_item(self, item, spider):
+        """
+        Xử lý từng item được scrapy trả về.
+        Lần đầu tiên mới xác thực (trong thread), trong lúc đó item chờ xác thực xong.
+        """
+        if not self._ready and self._connect_error is None:
+            if self._connecting is None:
+                spider.logger.info("🔐 Connecting to Google Drive (uploads are queued meanwhile)...")
+                self._connecting = deferToThread(self._connect, spider)
+                self._connecting.addCallbacks(
+                    self._connected, self._connect_failed,
+                    callbackArgs=(spider,), errbackArgs=(spider,)
+                )
+            # Mỗi item một Deferred riêng, được giải phóng ở _connected / _connect_failed
+            d = Deferred()
+            self._waiting.append(d)
+            await maybe_deferred_to_future(d)
+
+        return self._process_item(item, spider)
+
+    @profiled("process_item")
+    def _process_item(self, item, spider):
+        """Upload một item lên Drive"""
         self.upload_stats['total_items'] += 1
 
         try:
+            if self._connect_error is not None:
+                raise Exception(f"Google Drive is not available: {self._connect_error}")
+
             url = item.get('url')
             page_content = item.get('page_content')
             informations = item.get('informations', {})
@@ -145,9 +251,11 @@ class GoogleDrivePipeline:
             if not page_content and not informations:
                 raise DropItem("No content to upload: both page_content and texts are empty")
 
-            # Detect category và slug từ URL
-            category = self._detect_category(url)
-            slug = self._detect_slug(url)
+            # Category và slug đã được spider gán từ lúc parse sitemap
+            category = item.get('category')
+            slug = item.get('slug')
+            if not category or not slug:
+                category, slug = self.site.classifier.classify(url)
 
             uploaded_files = {}
 
@@ -182,16 +290,36 @@ class GoogleDrivePipeline:
                     mimetype="text/plain"
                 )
                 uploaded_files['txt_file_id'] = txt_file_id
-                self.upload_stats['txt_files'] = self.upload_stats.get('txt_files', 0) + 1
+                self.upload_stats['txt_files'] += 1
 
                 spider.logger.debug(f"📤 TXT uploaded: {text_category}/{txt_filename} -> {txt_file_id}")
 
+            # Upload bản có cấu trúc (JSON một dòng) cạnh file text: benh_json, thuoc_json, ...
+            if item.get('sections'):
+                json_category = f"{category}_json"
+                json_content = self._serialize_structured(item, category, slug)
+                json_filename = f"{slug}.json"
+
+                json_file_id = self._upload_file(
+                    content=json_content,
+                    filename=json_filename,
+                    category=json_category,
+                    url=url,
+                    mimetype="application/json"
+                )
+                uploaded_files['json_file_id'] = json_file_id
+                self.upload_stats['json_files'] += 1
+
+                spider.logger.debug(f"📤 JSON uploaded: {json_category}/{json_filename} -> {json_file_id}")
+
             # Log thành công
             files_info = []
             if uploaded_files.get('html_file_id'):
                 files_info.append("HTML")
             if uploaded_files.get('txt_file_id'):
                 files_info.append(f"TXT({len(txt_content)} charactes)")
+            if uploaded_files.get('json_file_id'):
+                files_info.append(f"JSON({len(item['sections'])} sections)")
 
             spider.logger.info(f"✅ {category}/{slug}: {' + '.join(files_info)}")
 
@@ -209,39 +337,34 @@ class GoogleDrivePipeline:
             self.upload_stats['failed_uploads'] += 1
             spider.logger.error(f"❌ Failed to upload {item.get('url', 'unknown')}: {e}")
             item['upload_error'] = str(e)
+
+            # Chưa lên Drive thì chưa coi là đã crawl, lần chạy sau sẽ thử lại
+            unmark_visited = getattr(spider, 'unmark_visited', None)
+            if unmark_visited is not None and item.get('url'):
+                unmark_visited(item['url'])
             return item
 
     
-    def _detect_category(self, url):
-        """Lấy category từ URL"""
-        # Ví dụ: https://tamanhhospital.vn/benh/abc -> category = "benh"
-        match = re.search(r"tamanhhospital\.vn/([^/]+)/", url)
-        if match:
-            category = match.group(1)
-            # Loại bỏ các ký tự đặc biệt trong tên folder
-            category = re.sub(r"[^a-zA-Z0-9_-]", "_", category)
-            return category
-        return "unknown"
-    
-    def _detect_slug(self, url):
-        """Lấy slug từ URL"""
-        # Lấy phần cuối cùng của URL làm slug
-        slug = url.rstrip("/").split("/")[-1]
-        # Loại bỏ các ký tự không hợp lệ cho tên file
-        slug = re.sub(r"[^a-zA-Z0-9_.-]", "_", slug)
-        
-        # Xử lý trường hợp slug rỗng hoặc chỉ có extension
-        if not slug or slug.startswith('.'):
-            slug = "index"
-        
-        # Giới hạn độ dài filename (Google Drive limit ~255 chars)
-        if len(slug) > 200:
-            slug = slug[:200]
-            
-        return slug
-    
-    def _get_or_create_folder(self, folder_name, parent_id):
+    @staticmethod
+    def _serialize_structured(item, category, slug):
+        """Chỉ giữ các trường có cấu trúc, ghi JSON gọn trên một dòng"""
+        record = {field: item.get(field) for field in STRUCTURED_FIELDS}
+        record['category'] = category
+        record['slug'] = slug
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+    def _execute(self, request):
+        """Gọi Drive API, đếm số lần gọi (drive/api_calls) cho run budget"""
+        if self.stats is not None:
+            self.stats.inc_value('drive/api_calls')
+        return request.execute()
+
+    def _get_or_create_folder(self, folder_name, parent_id, drive_service=None):
         """Tạo hoặc lấy folder ID, có cache để tránh tạo trùng"""
+        from googleapiclient.errors import HttpError
+
+        drive_service = drive_service or self.drive_service
+
         cache_key = f"{parent_id}_{folder_name}"
         
         if cache_key in self.folder_cache:
@@ -253,10 +376,10 @@ class GoogleDrivePipeline:
             if parent_id:
                 query += f" and '{parent_id}' in parents"
             
-            results = self.drive_service.files().list(
+            results = self._execute(drive_service.files().list(
                 q=query,
                 fields="files(id, name)"
-            ).execute()
+            ))
             
             folders = results.get('files', [])
             
@@ -275,10 +398,10 @@ class GoogleDrivePipeline:
             if parent_id:
                 file_metadata['parents'] = [parent_id]
             
-            folder = self.drive_service.files().create(
+            folder = self._execute(drive_service.files().create(
                 body=file_metadata,
                 fields='id'
-            ).execute()
+            ))
             
             folder_id = folder.get('id')
             self.folder_cache[cache_key] = folder_id
@@ -288,8 +411,12 @@ class GoogleDrivePipeline:
         except HttpError as error:
             raise Exception(f"Failed to create/get folder '{folder_name}': {error}")
     
+    @profiled("upload_file")
     def _upload_file(self, content, filename, category, url, mimetype='text/html'):
         """Upload file lên Google Drive"""
+        from googleapiclient.errors import HttpError
+        from googleapiclient.http import MediaIoBaseUpload
+
         try:
             # Tạo hoặc lấy folder ID cho category
             category_folder_id = self._get_or_create_folder(category, self.parent_folder_id)
@@ -326,11 +453,11 @@ class GoogleDrivePipeline:
             )
             
             # Upload file
-            file = self.drive_service.files().create(
+            file = self._execute(self.drive_service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id,name,webViewLink'
-            ).execute()
+            ))
             
             return file.get('id')
             
@@ -339,15 +466,17 @@ class GoogleDrivePipeline:
 
     def _check_file_exists(self, filename, parent_folder_id):
         """Kiểm tra file đã tồn tại chưa"""
+        from googleapiclient.errors import HttpError
+
         try:
             # Escape single quotes trong filename để tránh lỗi query
             escaped_filename = filename.replace("'", "\\'")
             query = f"name='{escaped_filename}' and '{parent_folder_id}' in parents and trashed=false"
             
-            results = self.drive_service.files().list(
+            results = self._execute(self.drive_service.files().list(
                 q=query,
                 fields="files(id, name, createdTime)"
-            ).execute()
+            ))
             
             files = results.get('files', [])
             return files[0]['id'] if files else None
@@ -357,6 +486,9 @@ class GoogleDrivePipeline:
 
     def _update_existing_file(self, file_id, content, mimetype, url):
         """Update file đã tồn tại thay vì tạo mới"""
+        from googleapiclient.errors import HttpError
+        from googleapiclient.http import MediaIoBaseUpload
+
         try:
             # Prepare content
             if isinstance(content, str):
@@ -379,12 +511,12 @@ class GoogleDrivePipeline:
             )
             
             # Update file
-            updated_file = self.drive_service.files().update(
+            updated_file = self._execute(self.drive_service.files().update(
                 fileId=file_id,
                 body=file_metadata,
                 media_body=media,
                 fields='id,name,modifiedTime'
-            ).execute()
+            ))
             
             return updated_file.get('id')
             
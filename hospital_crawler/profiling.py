@@ -0,0 +1,221 @@
+# Profiling cho các hot path của spider và pipeline (tắt mặc định)
+#
+#     PROFILING_ENABLED = True
+#     PROFILING_MODE = "cprofile"   # hoặc "sample"
+#
+# hoặc: python -m hospital_crawler.run --profile [cprofile|sample]
+#
+# Mỗi stage (parse, parse_info, parse_full_info, process_item, upload_file)
+# được đo riêng. Khi spider đóng, ghi vào PROFILING_DIR/<spider>-<thời điểm>/:
+#   - cprofile: <stage>.prof (pstats, dùng được với snakeviz / flameprof / gprof2dot)
+#   - sample:   <stage>.folded (collapsed stacks cho flamegraph.pl / speedscope)
+#   - summary.txt: thời gian mỗi stage + top-N hàm tốn thời gian nhất
+# Stage lồng nhau (parse_full_info trong parse_info, upload_file trong
+# process_item) được tính riêng, stage ngoài không gồm thời gian stage trong.
+
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from scrapy import signals
+
+
+_PROFILERS = weakref.WeakKeyDictionary()
+
+
+def get_profiler(crawler):
+    """Profiler của crawler (tạo một lần), None nếu PROFILING_ENABLED tắt"""
+    if crawler in _PROFILERS:
+        return _PROFILERS[crawler]
+
+    profiler = None
+    settings = crawler.settings
+    if settings.getbool("PROFILING_ENABLED"):
+        mode = settings.get("PROFILING_MODE", "cprofile")
+        profiler_cls = SamplingProfiler if mode == "sample" else StageProfiler
+        profiler = profiler_cls(settings)
+        crawler.signals.connect(profiler.spider_closed, signal=signals.spider_closed)
+    _PROFILERS[crawler] = profiler
+    return profiler
+
+
+def profiled(stage):
+    """
+    Đo method theo stage nếu instance có `profiler` (spider / pipeline).
+    Hỗ trợ cả generator callback của Scrapy: chỉ đo trong lúc generator chạy.
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(self, *args, **kwargs):
+                profiler = getattr(self, "profiler", None)
+                if profiler is None:
+                    return func(self, *args, **kwargs)
+                return profiler.wrap_generator(stage, func(self, *args, **kwargs))
+        else:
+            @functools.wraps(func)
+            def wrapper(self, *args, **kwargs):
+                profiler = getattr(self, "profiler", None)
+                if profiler is None:
+                    return func(self, *args, **kwargs)
+                with profiler.stage(stage):
+                    return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class StageProfiler:
+    """Một cProfile.Profile cho mỗi stage, chỉ bật khi stage đó đang chạy"""
+
+    def __init__(self, settings):
+        self.output_dir = settings.get("PROFILING_DIR", "profiles")
+        self.top_n = settings.getint("PROFILING_TOP_N", 30)
+        self.stack = []
+        self.calls = Counter()
+        self.wall_time = defaultdict(float)  # bao gồm cả stage lồng bên trong
+        self.profiles = {}
+
+    @contextmanager
+    def stage(self, name, count=True):
+        parent = self.stack[-1] if self.stack else None
+        if parent:
+            self._pause(parent)
+        self.stack.append(name)
+        self._resume(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.wall_time[name] += time.perf_counter() - started
+            if count:
+                self.calls[name] += 1
+            self._pause(name)
+            self.stack.pop()
+            if parent:
+                self._resume(parent)
+
+    def wrap_generator(self, name, generator):
+        # Một generator = một lần gọi, các lần resume sau chỉ cộng thêm thời gian
+        first = True
+        while True:
+            with self.stage(name, count=first):
+                first = False
+                try:
+                    value = next(generator)
+                except StopIteration:
+                    return
+            yield value
+
+    def _resume(self, name):
+        if name not in self.profiles:
+            self.profiles[name] = cProfile.Profile()
+        self.profiles[name].enable()
+
+    def _pause(self, name):
+        self.profiles[name].disable()
+
+    def _write_stage(self, directory, name):
+        path = os.path.join(directory, f"{name}.prof")
+        self.profiles[name].dump_stats(path)
+        return path
+
+    def _top_functions(self, name):
+        buffer = io.StringIO()
+        stats = pstats.Stats(self.profiles[name], stream=buffer)
+        stats.sort_stats("cumulative").print_stats(self.top_n)
+        return buffer.getvalue()
+
+    def spider_closed(self, spider, reason):
+        directory = os.path.join(self.output_dir, f"{spider.name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        os.makedirs(directory, exist_ok=True)
+
+        lines = [f"Spider: {spider.name} (reason: {reason})", ""]
+        for name in sorted(self.wall_time, key=self.wall_time.get, reverse=True):
+            lines.append(f"{name:<20} calls={self.calls[name]:<8} wall={self.wall_time[name]:.3f}s")
+        for name in sorted(self.profiles):
+            self._write_stage(directory, name)
+            lines += ["", "=" * 50, f"STAGE: {name}", "=" * 50, self._top_functions(name)]
+
+        with open(os.path.join(directory, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        spider.logger.info(f"🔬 Profiling output written to {directory}")
+        for line in lines[2:2 + len(self.wall_time)]:
+            spider.logger.info(f"🔬 {line}")
+
+
+class SamplingProfiler(StageProfiler):
+    """
+    Sampler chi phí thấp: một thread nền chụp stack của reactor thread mỗi
+    PROFILING_SAMPLE_INTERVAL giây và gom theo stage đang chạy.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.interval = settings.getfloat("PROFILING_SAMPLE_INTERVAL", 0.005)
+        self.samples = defaultdict(Counter)
+        self.thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _resume(self, name):
+        if self._thread is None:
+            self.thread_id = threading.get_ident()
+            self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+            self._thread.start()
+
+    def _pause(self, name):
+        pass
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                name = self.stack[-1]
+            except IndexError:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples[name][self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _write_stage(self, directory, name):
+        path = os.path.join(directory, f"{name}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples[name].items():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _top_functions(self, name):
+        # Đếm theo frame trên cùng (self time)
+        leaves = Counter()
+        for stack, count in self.samples[name].items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return "\n".join(
+            f"{count:>8} {count * 100 / total:6.2f}%  {leaf}"
+            for leaf, count in leaves.most_common(self.top_n)
+        )
+
+    def spider_closed(self, spider, reason):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.profiles = {name: None for name in self.samples}
+        super().spider_closed(spider, reason)
@@ -0,0 +1,79 @@
+# Chạy nhiều site cùng lúc trong một tiến trình
+#
+#     python -m hospital_crawler.run                 # site mặc định
+#     python -m hospital_crawler.run tamanhhospital other_site
+#     python -m hospital_crawler.run --all
+#     python -m hospital_crawler.run --max-seconds 3600 --max-drive-calls 5000
+#     python -m hospital_crawler.run --profile sample
+#     python -m hospital_crawler.run --cache --ignore-visited   # vòng lặp dev, đọc từ cache
+#
+# Mỗi site là một crawler riêng nên có ngân sách concurrency riêng
+# (SITES[<site>]["concurrency"]).
+
+import argparse
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from hospital_crawler.sites import SITES, DEFAULT_SITE, get_site
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Hospital crawler")
+    parser.add_argument("sites", nargs="*", help=f"Site cần crawl ({', '.join(SITES)})")
+    parser.add_argument("--all", action="store_true", help="Crawl toàn bộ site đã khai báo")
+
+    # Ngân sách cho một lần chạy (áp dụng cho từng site), xem RunBudgetMiddleware
+    budget = parser.add_argument_group("run budget")
+    budget.add_argument("--max-seconds", type=float, help="Thời gian chạy tối đa")
+    budget.add_argument("--max-items", type=int, help="Số item tối đa")
+    budget.add_argument("--max-bytes", type=int, help="Tổng số byte tải về tối đa")
+    budget.add_argument("--max-drive-calls", type=int, help="Số lần gọi Google Drive API tối đa")
+
+    parser.add_argument("--cache", action="store_true",
+                        help="Bật HTTP cache trên đĩa (dev / chạy lại), xem hospital_crawler/httpcache.py")
+    parser.add_argument("--ignore-visited", action="store_true",
+                        help="Crawl lại cả các URL đã có trong file visited URLs")
+
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=["cprofile", "sample"],
+                        help="Bật profiling (mặc định cProfile), xem hospital_crawler/profiling.py")
+    parser.add_argument("--profile-dir", help="Thư mục ghi kết quả profiling")
+    return parser
+
+
+BUDGET_SETTINGS = {
+    "max_seconds": "RUN_BUDGET_SECONDS",
+    "max_items": "RUN_BUDGET_ITEMS",
+    "max_bytes": "RUN_BUDGET_BYTES",
+    "max_drive_calls": "RUN_BUDGET_DRIVE_CALLS",
+}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    site_names = list(SITES) if args.all else (args.sites or [DEFAULT_SITE])
+
+    settings = get_project_settings()
+    settings.set("LOG_LEVEL", "WARNING")  # giảm log rác của Scrapy
+    for arg, setting in BUDGET_SETTINGS.items():
+        if getattr(args, arg) is not None:
+            settings.set(setting, getattr(args, arg), priority="cmdline")
+    if args.cache:
+        settings.set("HTTPCACHE_ENABLED", True, priority="cmdline")
+    if args.ignore_visited:
+        settings.set("SKIP_VISITED_URLS", False, priority="cmdline")
+    if args.profile:
+        settings.set("PROFILING_ENABLED", True, priority="cmdline")
+        settings.set("PROFILING_MODE", args.profile, priority="cmdline")
+    if args.profile_dir:
+        settings.set("PROFILING_DIR", args.profile_dir, priority="cmdline")
+
+    process = CrawlerProcess(settings=settings)
+    for site_name in site_names:
+        spider_name = get_site(site_name).spider_name
+        process.crawl(process.spider_loader.load(spider_name))
+    process.start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Chính sách ưu tiên request
+#
+# Priority của request chi tiết được tính từ:
+#   - giá trị category (SITES[<site>]["category_weights"])
+#   - <priority> trong sitemap
+#   - độ "cũ" của trang: <lastmod> so với lần crawl trước
+# Điểm số [0, 1] được lượng tử hoá thành SCHEDULING_PRIORITY_LEVELS mức nguyên
+# để số bucket trong priority queue của Scrapy luôn nhỏ và cố định.
+
+import time
+from datetime import datetime, timezone
+
+
+DEFAULT_WEIGHTS = {
+    "category": 0.5,
+    "sitemap_priority": 0.2,
+    "staleness": 0.3,
+}
+
+
+def parse_lastmod(value):
+    """Chuyển <lastmod> (W3C datetime) thành epoch seconds, lỗi -> None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class SchedulingPolicy:
+    """
+    Policy mặc định: mọi request chi tiết cùng priority (hành vi cũ).
+    Policy tuỳ chỉnh khai báo qua setting SCHEDULING_POLICY.
+    """
+
+    def __init__(self, settings):
+        self.levels = settings.getint("SCHEDULING_PRIORITY_LEVELS", 100)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings)
+
+    @property
+    def sitemap_priority(self):
+        """Sitemap luôn đứng trước mọi trang chi tiết để frontier được mở rộng sớm"""
+        return 1
+
+    def score(self, site, category, lastmod=None, sitemap_priority=None, last_crawled=None, now=None):
+        return 1.0
+
+    def priority(self, site, category, lastmod=None, sitemap_priority=None, last_crawled=None, now=None):
+        """Priority Scrapy (số lớn hơn chạy trước), luôn < 0 để nhường sitemap"""
+        score = self.score(site, category, lastmod, sitemap_priority, last_crawled, now)
+        score = min(max(score, 0.0), 1.0)
+        return int(round(score * self.levels)) - self.levels - 1
+
+    def needs_crawl(self, lastmod=None, last_crawled=None, now=None):
+        """URL đã crawl thì bỏ qua"""
+        return last_crawled is None
+
+
+class FreshnessPolicy(SchedulingPolicy):
+    """
+    Ưu tiên category giá trị cao, <priority> sitemap cao và trang lâu chưa crawl.
+    Trang đã crawl được crawl lại khi có <lastmod> mới hơn lần crawl trước
+    hoặc đã quá SCHEDULING_STALE_AFTER_DAYS kể từ lần crawl trước (0 = tắt).
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        weights = dict(DEFAULT_WEIGHTS)
+        weights.update(settings.getdict("SCHEDULING_WEIGHTS"))
+        total = sum(weights.values()) or 1.0
+        self.weights = {key: value / total for key, value in weights.items()}
+        self.stale_after = settings.getfloat("SCHEDULING_STALE_AFTER_DAYS", 30) * 86400
+        self.recrawl_modified = settings.getbool("SCHEDULING_RECRAWL_MODIFIED", True)
+
+    def score(self, site, category, lastmod=None, sitemap_priority=None, last_crawled=None, now=None):
+        now = now or time.time()
+
+        category_value = site.category_weights.get(category, site.default_category_weight)
+        if sitemap_priority is None:
+            sitemap_priority = 0.5
+
+        staleness = self.staleness(last_crawled, now, lastmod)
+
+        return (
+            self.weights.get("category", 0) * category_value
+            + self.weights.get("sitemap_priority", 0) * sitemap_priority
+            + self.weights.get("staleness", 0) * staleness
+        )
+
+    def staleness(self, last_crawled, now, lastmod=None):
+        """
+        Độ cũ (0..1) tăng dần theo thời gian kể từ lần crawl trước:
+        age / (age + stale_after), bằng 0.5 đúng lúc quá hạn.
+        Chưa crawl hoặc <lastmod> mới hơn lần crawl trước -> 1.0
+        """
+        if last_crawled is None or (lastmod and lastmod > last_crawled):
+            return 1.0
+        age = max(now - last_crawled, 0.0)
+        if not self.stale_after:
+            return 1.0 if age else 0.0
+        return age / (age + self.stale_after)
+
+    def needs_crawl(self, lastmod=None, last_crawled=None, now=None):
+        if last_crawled is None:
+            return True
+        if self.recrawl_modified and lastmod and lastmod > last_crawled:
+            return True
+        now = now or time.time()
+        return bool(self.stale_after and now - last_crawled >= self.stale_after)
@@ -49,6 +49,19 @@ DOWNLOAD_DELAY = 1
 #DOWNLOADER_MIDDLEWARES = {
 #    "hospital_crawler.middlewares.HospitalCrawlerDownloaderMiddleware": 543,
 #}
+DOWNLOADER_MIDDLEWARES = {
+    # Đứng trước mọi middleware khác để request bị bỏ qua không tốn gì thêm
+    "hospital_crawler.middlewares.RunBudgetMiddleware": 50,
+    # HTTP cache làm mới timestamp sau 304, thay cho middleware mặc định (cùng vị trí)
+    "scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware": None,
+    "hospital_crawler.httpcache.RevalidatingCacheMiddleware": 900,
+}
+
+# Run budgets (0 = unlimited), see RunBudgetMiddleware
+RUN_BUDGET_SECONDS = 0
+RUN_BUDGET_ITEMS = 0
+RUN_BUDGET_BYTES = 0
+RUN_BUDGET_DRIVE_CALLS = 0
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -62,6 +75,20 @@ DOWNLOAD_DELAY = 1
 #    "hospital_crawler.pipelines.HospitalCrawlerPipeline": 300,
 #}
 
+# Request prioritization (see hospital_crawler/scheduling.py)
+SCHEDULING_POLICY = "hospital_crawler.scheduling.FreshnessPolicy"
+SCHEDULING_PRIORITY_LEVELS = 100
+SCHEDULING_WEIGHTS = {"category": 0.5, "sitemap_priority": 0.2, "staleness": 0.3}
+SCHEDULING_STALE_AFTER_DAYS = 30  # re-crawl unchanged pages after this long (0 = never)
+SCHEDULING_RECRAWL_MODIFIED = True
+
+# Profiling of spider/pipeline hot paths (see hospital_crawler/profiling.py)
+PROFILING_ENABLED = False
+PROFILING_MODE = "cprofile"  # or "sample"
+PROFILING_DIR = "profiles"
+PROFILING_TOP_N = 30
+PROFILING_SAMPLE_INTERVAL = 0.005
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 #AUTOTHROTTLE_ENABLED = True
@@ -82,6 +109,17 @@ DOWNLOAD_DELAY = 1
 #HTTPCACHE_DIR = "httpcache"
 #HTTPCACHE_IGNORE_HTTP_CODES = []
 #HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Project cache (see hospital_crawler/httpcache.py), enable with `run.py --cache`
+HTTPCACHE_STORAGE = "hospital_crawler.httpcache.CompressedCacheStorage"
+HTTPCACHE_POLICY = "hospital_crawler.httpcache.SiteTTLPolicy"
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [403, 429, 500, 502, 503, 504]
+HTTPCACHE_DEFAULT_TTL = 7 * 86400  # per-site TTLs: SITES[<site>]["cache_ttl"]
+HTTPCACHE_REVALIDATE = True
+HTTPCACHE_GZIP_LEVEL = 6
+
+# Skip URLs already recorded in the visited-urls file (disable to re-parse everything)
+SKIP_VISITED_URLS = True
 
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
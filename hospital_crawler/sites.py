@@ -0,0 +1,193 @@
+# Cấu hình khai báo cho từng website bệnh viện
+#
+# Mỗi site chỉ là một dict: sitemap, selector nội dung, selector cần loại bỏ,
+# luật phân loại category... Spider và pipeline chung (HospitalSpider,
+# GoogleDrivePipeline) đọc cấu hình này thay vì hardcode theo từng domain.
+
+import re
+from functools import cached_property, lru_cache
+
+import soupsieve
+
+from hospital_crawler.urls import UrlClassifier
+
+
+SITES = {
+    "tamanhhospital": {
+        "spider_name": "ta_hospital",
+        "allowed_domains": ["tamanhhospital.vn"],
+        "base_url": "https://tamanhhospital.vn/",
+        "sitemaps": [
+            # "https://tamanhhospital.vn/",
+            "https://tamanhhospital.vn/benh-sitemap1.xml",
+            "https://tamanhhospital.vn/benh-sitemap2.xml", # 1296 urls
+            "https://tamanhhospital.vn/thuoc-sitemap.xml", # 243 urls
+            "https://tamanhhospital.vn/cothenguoi-sitemap.xml", # 224 urls
+            "https://tamanhhospital.vn/tiemchung-sitemap.xml", # 171 urls
+            "https://tamanhhospital.vn/vikhuan-sitemap.xml", # 6 urls
+            "https://tamanhhospital.vn/virus-sitemap.xml", # 25 urls
+            "https://tamanhhospital.vn/tebao-sitemap.xml", # 17 urls
+            "https://tamanhhospital.vn/vitamin-sitemap.xml", # 15 urls
+            "https://tamanhhospital.vn/hormone-sitemap.xml" # 4 urls
+        ],
+        # Khung chứa nội dung bài viết
+        "content_selector": "div#ftwp-postcontent",
+        # Mục lục và thông tin quảng cáo bệnh viện
+        "strip_selectors": ["nav", "div.content_insert"],
+        "text_tags": ["h2", "h3", "p", "li"],
+        # Metadata bài viết (thẻ <meta> lấy thuộc tính content, thẻ khác lấy text)
+        "meta_selectors": {
+            "title": "h1",
+            "updated_at": 'meta[property="article:modified_time"]',
+            "author": 'meta[name="author"]',
+            # Chưa có selector cho khối "Tham vấn y khoa" -> reviewer luôn là None.
+            # Khai báo CSS tại đây khi đã xác định được cấu trúc HTML của khối này.
+            "reviewer": None,
+        },
+        # Luật phân loại: (regex, category). Category rỗng -> lấy group(1)
+        "category_rules": [
+            (r"tamanhhospital\.vn/([^/]+)/", None),
+        ],
+        # Giá trị mỗi category khi xếp lịch crawl (0..1), xem scheduling.FreshnessPolicy
+        "category_weights": {
+            "benh": 1.0,
+            "thuoc": 0.8,
+            "tiemchung": 0.7,
+            "cothenguoi": 0.6,
+            "virus": 0.5,
+            "vikhuan": 0.5,
+            "tebao": 0.4,
+            "vitamin": 0.2,
+            "hormone": 0.2,
+        },
+        # TTL của HTTP cache (giây, 0 = không hết hạn), xem hospital_crawler/httpcache.py
+        # Trang chi tiết: categories -> sitemaps (sitemap chứa URL đó) -> default
+        # Sitemap: sitemaps -> sitemap
+        "cache_ttl": {
+            "default": 7 * 86400,
+            "sitemap": 86400,
+            "categories": {
+                "benh": 3 * 86400,
+            },
+            "sitemaps": {
+                # Sitemap nhỏ, hiếm khi thay đổi
+                "https://tamanhhospital.vn/vitamin-sitemap.xml": 7 * 86400,
+                "https://tamanhhospital.vn/hormone-sitemap.xml": 7 * 86400,
+            },
+        },
+        "visited_urls_file": "visited_urls.json",
+        # None -> upload thẳng vào root folder (giữ cấu trúc cũ)
+        "drive_folder": None,
+        # Ngân sách concurrency riêng cho site này
+        "concurrency": {
+            "CONCURRENT_REQUESTS": 32,
+            "CONCURRENT_REQUESTS_PER_DOMAIN": 16,
+            "DOWNLOAD_DELAY": 1,
+        },
+    },
+    # Thêm site mới theo mẫu:
+    # "example": {
+    #     "allowed_domains": ["example-hospital.vn"],
+    #     "base_url": "https://example-hospital.vn/",
+    #     "sitemaps": ["https://example-hospital.vn/sitemap_index.xml"],
+    #     "content_selector": "article .entry-content",
+    #     "strip_selectors": [".toc", ".related-posts"],
+    #     "category_rules": [(r"/benh-hoc/", "benh"), (r"/thuoc/", "thuoc")],
+    #     "concurrency": {"CONCURRENT_REQUESTS_PER_DOMAIN": 4},
+    # },
+}
+
+DEFAULT_SITE = "tamanhhospital"
+
+
+class SiteConfig:
+    """
+    Cấu hình đã chuẩn hoá của một site.
+    Selector và regex chỉ compile một lần rồi được cache trên instance.
+    """
+
+    def __init__(self, name, config):
+        self.name = name
+        self.spider_name = config.get("spider_name", name)
+        self.allowed_domains = list(config.get("allowed_domains", []))
+        self.base_url = config.get("base_url", "")
+        self.sitemaps = list(config.get("sitemaps", []))
+        self.content_selector_css = config["content_selector"]
+        self.strip_selectors_css = list(config.get("strip_selectors", []))
+        self.text_tags = list(config.get("text_tags", ["h2", "h3", "p", "li"]))
+        self.meta_selectors_css = dict(config.get("meta_selectors", {"title": "h1"}))
+        self.category_rules_raw = list(config.get("category_rules", []))
+        self.category_weights = dict(config.get("category_weights", {}))
+        self.default_category_weight = config.get("default_category_weight", 0.5)
+        self.cache_ttl_config = dict(config.get("cache_ttl", {}))
+        self.visited_urls_file = config.get("visited_urls_file", f"visited_urls_{name}.json")
+        self.drive_folder = config.get("drive_folder", name)
+        self.concurrency = dict(config.get("concurrency", {}))
+
+    def __repr__(self):
+        return f"<SiteConfig {self.name}>"
+
+    @cached_property
+    def content_selector(self):
+        return soupsieve.compile(self.content_selector_css)
+
+    @cached_property
+    def strip_selectors(self):
+        return [soupsieve.compile(css) for css in self.strip_selectors_css]
+
+    @cached_property
+    def meta_selectors(self):
+        return {field: soupsieve.compile(css) for field, css in self.meta_selectors_css.items() if css}
+
+    @cached_property
+    def category_rules(self):
+        return [(re.compile(pattern), category) for pattern, category in self.category_rules_raw]
+
+    def find_content(self, soup):
+        """Tìm khung nội dung chính, bỏ đi các phần không cần thiết"""
+        container = self.content_selector.select_one(soup)
+        if container is None:
+            return None
+        for selector in self.strip_selectors:
+            for tag in selector.select(container):
+                tag.decompose()
+        return container
+
+    def extract_meta(self, soup):
+        """
+        Lấy title, ngày cập nhật, tác giả... theo meta_selectors của site.
+        Field khai báo selector None vẫn có mặt trong kết quả với giá trị None.
+        """
+        meta = dict.fromkeys(self.meta_selectors_css)
+        for field, selector in self.meta_selectors.items():
+            tag = selector.select_one(soup)
+            if tag is None:
+                meta[field] = None
+            elif tag.name == "meta":
+                meta[field] = (tag.get("content") or "").strip() or None
+            else:
+                meta[field] = tag.get_text(separator=" ", strip=True) or None
+        return meta
+
+    def cache_ttl(self, category=None, sitemap_url=None, is_sitemap=False):
+        """TTL cache cho một request theo category / sitemap, None = dùng HTTPCACHE_DEFAULT_TTL"""
+        config = self.cache_ttl_config
+        sitemaps = config.get("sitemaps", {})
+        if is_sitemap:
+            return sitemaps.get(sitemap_url, config.get("sitemap"))
+        categories = config.get("categories", {})
+        if category in categories:
+            return categories[category]
+        return sitemaps.get(sitemap_url, config.get("default"))
+
+    @cached_property
+    def classifier(self):
+        return UrlClassifier(self.category_rules)
+
+
+@lru_cache(maxsize=None)
+def get_site(name):
+    """Lấy SiteConfig theo tên (cache theo tiến trình)"""
+    if name not in SITES:
+        raise KeyError(f"Unknown site: {name!r}. Available: {', '.join(SITES)}")
+    return SiteConfig(name, SITES[name])
@@ -0,0 +1,411 @@
+import scrapy
+import xmltodict
+import json
+from time import strftime, gmtime
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, PreformattedString, Tag
+from scrapy import Request
+import traceback
+import os
+import shutil
+import time
+from scrapy.exceptions import IgnoreRequest
+from scrapy.settings import Settings
+from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.utils.misc import load_object
+
+from hospital_crawler.items import HospitalArticleItem
+from hospital_crawler.profiling import get_profiler, profiled
+from hospital_crawler.scheduling import SchedulingPolicy, parse_lastmod
+from hospital_crawler.sites import get_site
+
+
+# Mã 4xx không phải lỗi cuối cùng (bị chặn / rate limit), lần chạy sau vẫn thử lại
+RETRYABLE_CLIENT_ERRORS = {403, 408, 429}
+
+# Heading nào mở section mới, kèm level
+HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+# Danh sách con trong một <li>: mỗi <li> con được lấy thành một dòng riêng
+NESTED_LIST_TAGS = ("ul", "ol")
+
+
+class HospitalSpider(scrapy.Spider):
+    """
+    Spider chung cho mọi site bệnh viện.
+    Domain, sitemap, selector... lấy từ SiteConfig (xem hospital_crawler/sites.py).
+    Subclass chỉ cần khai báo `name` và `site_name`.
+    """
+    site_name = None
+    profiler = None
+    skip_visited = True
+
+    custom_settings = {
+        "RANDOMIZE_DOWNLOAD_DELAY": True, # thêm ngẫu nhiên để tránh bị nhận diện bot
+
+        # Cấu hình pipeline
+        "ITEM_PIPELINES": {
+            "hospital_crawler.pipelines.GoogleDrivePipeline": 300,
+        },
+
+        # Google Drive settings
+        "GOOGLE_OAUTH_KEY_FILE": "credentials.json",
+        "GOOGLE_OAUTH_TOKEN_FILE": 'token.json',
+        "GOOGLE_DRIVE_PARENT_FOLDER_ID": '1LY22CGQ8w1Y8ciZuv46pCQPIiKKiGLfs',  # None để tự tạo folder root
+
+
+        'LOG_LEVEL': 'INFO'
+
+        }
+
+    @classmethod
+    def update_settings(cls, settings):
+        # Ngân sách concurrency riêng của từng site (mỗi site một crawler)
+        if cls.site_name:
+            settings.setdict(get_site(cls.site_name).concurrency, priority="spider")
+        super().update_settings(settings)
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        policy_cls = load_object(crawler.settings.get("SCHEDULING_POLICY", SchedulingPolicy))
+        spider.scheduling_policy = policy_cls.from_crawler(crawler)
+        spider.profiler = get_profiler(crawler)
+        spider.skip_visited = crawler.settings.getbool("SKIP_VISITED_URLS", True)
+        return spider
+
+    def __init__(self, site=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Concurrency (update_settings) đã được áp dụng theo site_name của class trước khi
+        # spider được tạo, nên không cho `-a site=` đổi sang site khác: dùng spider của site đó
+        if site and self.site_name and site != self.site_name:
+            raise ValueError(
+                f"Spider {self.name!r} crawls site {self.site_name!r}, got site={site!r}. "
+                f"Run the spider of that site instead (SITES[{site!r}]['spider_name'])"
+            )
+        self.site = get_site(site or self.site_name)
+        self.allowed_domains = self.site.allowed_domains
+        self.start_urls = self.site.sitemaps
+        self.visited_urls_file = self.site.visited_urls_file
+        self.scheduling_policy = SchedulingPolicy(Settings())
+        self.visited_urls = {}  # url -> thời điểm crawl (epoch), ghi ra file khi kết thúc
+        self._visited_keys = {}  # response.url -> URL trong sitemap (chỉ khi bị redirect)
+
+        # Load từ file nếu có
+        if os.path.exists(self.visited_urls_file):
+            try:
+                with open(self.visited_urls_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, list):
+                    # Định dạng cũ (chỉ có URL): coi như crawl lúc file được ghi
+                    crawled_at = os.path.getmtime(self.visited_urls_file)
+                    data = dict.fromkeys(data, crawled_at)
+                self.visited_urls = data
+                self.logger.info(f"✅ Loaded {len(self.visited_urls)} visited URLs from {self.visited_urls_file}")
+            except Exception as e:
+                self.logger.error(f"❌ Failed to load visited URLs: {e}")
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        for url in self.start_urls:
+            yield Request(
+                url=url,
+                callback=self.parse,
+                dont_filter=True,
+                meta=self._sitemap_meta(url)
+            )
+
+    def _sitemap_meta(self, url):
+        ttl = self.site.cache_ttl(sitemap_url=url, is_sitemap=True)
+        return {} if ttl is None else {'cache_ttl': ttl}
+
+    def closed(self, reason):
+        try:
+            # Kiểm tra nếu file tồn tại thì backup
+            if os.path.exists(self.visited_urls_file):
+                backup_file = self.visited_urls_file + ".backup"
+                shutil.copy2(self.visited_urls_file, backup_file)
+                self.logger.info(f"💾 Backup created: {backup_file}")
+
+            # Ghi ra file tạm rồi thay thế, tránh file hỏng nếu bị dừng giữa chừng
+            tmp_file = self.visited_urls_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(self.visited_urls, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, self.visited_urls_file)
+            self.logger.info(f"💾 Saved {len(self.visited_urls)} visited URLs to {self.visited_urls_file} (reason: {reason})")
+        except Exception as e:
+            self.logger.error(f"❌ Failed to save visited URLs: {e}")
+
+    @profiled("parse")
+    def parse(self, response):
+        if response.status == 403:
+            self.logger.error(f"🚫 Access forbidden for URL: {response.url}")
+            return
+
+        self.logger.info(f"📥 Received response from {response.url} ({response.status})")
+
+        try:
+            # Parse XML body thành dict
+            json_data = xmltodict.parse(response.text)
+
+            # Kiểm tra đây là sitemapindex hay urlset
+            if 'sitemapindex' in json_data:
+                self.logger.info(f"📋 Found sitemapindex - parsing sub-sitemaps...")
+                sitemap_list = json_data['sitemapindex'].get('sitemap', [])
+                if isinstance(sitemap_list, dict):
+                    sitemap_list = [sitemap_list]
+
+                for sitemap_item in sitemap_list:
+                    sitemap_url = sitemap_item.get('loc')
+                    if sitemap_url:
+                        yield Request(
+                            url=sitemap_url,
+                            callback=self.parse,
+                            headers={'Referer': self.site.base_url},
+                            priority=self.scheduling_policy.sitemap_priority,
+                            meta=self._sitemap_meta(sitemap_url)
+                        )
+
+            elif 'urlset' in json_data:
+                self.logger.info(f"📄 Found urlset - extracting URLs...")
+                url_list = json_data['urlset'].get('url', [])
+                if isinstance(url_list, dict):
+                    url_list = [url_list]
+
+
+                extracted_urls = []
+                now = time.time()
+                for url_item in url_list:
+                    if isinstance(url_item, dict):
+                        loc = url_item.get('loc')
+                        if not loc:
+                            continue
+                        lastmod = parse_lastmod(url_item.get('lastmod'))
+                        last_crawled = self.visited_urls.get(loc) if self.skip_visited else None
+                        if not self.scheduling_policy.needs_crawl(lastmod, last_crawled, now):
+                            continue
+
+                        extracted_urls.append(loc)
+                        # Phân loại ngay khi đọc sitemap, truyền theo meta
+                        category, slug = self.site.classifier.classify(loc)
+                        priority = self.scheduling_policy.priority(
+                            self.site, category,
+                            lastmod=lastmod,
+                            sitemap_priority=self._sitemap_priority(url_item),
+                            last_crawled=last_crawled,
+                            now=now
+                        )
+                        meta = {'category': category, 'slug': slug, 'sitemap_loc': loc}
+                        cache_ttl = self.site.cache_ttl(category=category, sitemap_url=response.url)
+                        if cache_ttl is not None:
+                            meta['cache_ttl'] = cache_ttl
+                        yield Request(
+                            url=loc,
+                            callback=self.parse_info,
+                            errback=self.parse_info_error,
+                            headers={'Referer': self.site.base_url},
+                            meta=meta,
+                            priority=priority
+                        )
+
+                self.logger.info(f"📊 Found {len(extracted_urls)} unique URLs in {response.url}")
+
+            else:
+                self.logger.warning(f"⚠️ Unknown sitemap format: {list(json_data.keys())}")
+
+        except Exception as e:
+            self.logger.error(f"❌ Error parsing sitemap {response.url}: {e}")
+            self.logger.error(f"Response body preview: {response.text[:500]}")
+            self.logger.error(traceback.format_exc())
+
+
+    @profiled("parse_info")
+    def parse_info(self, response):
+        url = response.url
+        category, slug = self._classify_response(response)
+        item = HospitalArticleItem(
+            url=url,
+            site=self.site.name,
+            category=category,
+            slug=slug,
+            informations={},
+        )
+        # Chỉ đánh dấu visited khi đã tải về, request bị bỏ dở (budget, dừng giữa chừng)
+        # sẽ được crawl ở lần chạy sau
+        visited_key = response.meta.get('sitemap_loc', url)
+        self.visited_urls[visited_key] = time.time()
+        if visited_key != url:
+            self._visited_keys[url] = visited_key
+        try:
+            print(f'📄 Parsing product: {response.url}')
+            soup = BeautifulSoup(response.text, "lxml")
+
+            # Lấy metadata trước khi find_content cắt bỏ các phần thừa
+            meta = self.site.extract_meta(soup)
+            detail_container = self.site.find_content(soup)
+
+            if not detail_container:
+                print(f"⚠️ Critical: Main '{self.site.content_selector_css}' container not found for {url}. Aborting.")
+                return
+
+            full_info, sections = self.parse_full_info(detail_container, url)
+            item['informations']['full_info'] = full_info
+            item['sections'] = sections
+            item['title'] = meta.get('title')
+            item['updated_at'] = meta.get('updated_at')
+            item['author'] = meta.get('author')
+            item['reviewer'] = meta.get('reviewer')
+
+            item['page_content'] = response.text
+            item['crawled_at'] = strftime("%Y-%m-%d %H:%M:%S", gmtime())
+            item['status'] = 'success'
+            yield item
+
+        except Exception as e:
+            print(f'❌ Error parsing article {response.url}: {e}')
+            item['page_content'] = response.body
+            item['crawled_at'] = strftime("%Y-%m-%d %H:%M:%S", gmtime())
+            item['status'] = f"error: {str(e)}"
+            yield item
+
+
+    def unmark_visited(self, url):
+        """Bỏ đánh dấu visited (vd upload thất bại) để lần chạy sau crawl lại"""
+        self.visited_urls.pop(self._visited_keys.pop(url, url), None)
+
+
+    def parse_info_error(self, failure):
+        """
+        Lỗi 4xx (404, 410...) là kết quả cuối cùng: vẫn đánh dấu visited để không
+        bị xếp lại ở mọi lần chạy sau. Lỗi mạng, 5xx và RETRYABLE_CLIENT_ERRORS
+        giữ nguyên để thử lại lần sau.
+        """
+        if failure.check(IgnoreRequest):
+            # Bị bỏ qua có chủ ý (run budget...), đã được đếm trong stats (budget/skipped_requests)
+            return
+        if not failure.check(HttpError):
+            self.logger.warning(f"⚠️ Request failed: {failure.request.url} ({failure.getErrorMessage()})")
+            return
+        response = failure.value.response
+        if 400 <= response.status < 500 and response.status not in RETRYABLE_CLIENT_ERRORS:
+            self.visited_urls[response.meta.get('sitemap_loc', response.url)] = time.time()
+            self.logger.info(f"🚫 {response.status} for {response.url}, marked as visited")
+        else:
+            self.logger.warning(f"⚠️ HTTP {response.status} for {response.url}, will retry next run")
+
+
+    @staticmethod
+    def _sitemap_priority(url_item):
+        """<priority> trong sitemap (0.0 - 1.0), không có hoặc lỗi -> None"""
+        try:
+            return float(url_item.get('priority'))
+        except (TypeError, ValueError):
+            return None
+
+
+    def _classify_response(self, response):
+        """Lấy category/slug từ meta (đã tính lúc parse sitemap), nếu thiếu thì phân loại lại"""
+        category = response.meta.get('category')
+        slug = response.meta.get('slug')
+        if category is None or slug is None:
+            category, slug = self.site.classifier.classify(response.url)
+        return category, slug
+
+
+    @profiled("parse_full_info")
+    def parse_full_info(self, detail_container, url):
+        """
+        Lay toan bo noi dung trong phan body
+        (mục lục, thông tin bệnh viện... đã bị loại bỏ theo strip_selectors của site)
+
+        Một lần duyệt trả về cả bản text (như cũ) lẫn danh sách section có cấu trúc
+        """
+        document_lines = []
+        previous_tag = None
+        sections = []
+        current = self._new_section(None, 0)
+
+        document_lines.append(str(url))
+        document_lines.append(f'Crawled at: {strftime("%Y-%m-%d %H:%M:%S", gmtime())}')
+
+        for tag in detail_container.find_all(self.site.text_tags, recursive=True):
+            if tag.name == "li":
+                # <li> lồng nhau vẫn lấy từng dòng, <li> cha không lấy lại text của danh sách con
+                text = self._list_item_text(tag)
+            elif self._inside_list_item(tag, detail_container):
+                # <p>... trong <li> đã nằm trong text của <li> -> bỏ qua để không lặp nội dung
+                continue
+            else:
+                text = tag.get_text(separator=" ", strip=True)
+
+            # Add blank line before new <h2> section
+            if tag.name == "h2" and previous_tag is not None:
+                document_lines.append("")  # adds \n\n when joined
+
+            if not text:
+                continue
+
+            # Format unordered lists
+            if tag.name == "li":
+                document_lines.append(f"- {text}")
+                current['list_items'].append(text)
+            elif tag.name in HEADING_LEVELS:
+                document_lines.append(text)
+                if current['heading'] or current['paragraphs'] or current['list_items']:
+                    sections.append(current)
+                current = self._new_section(text, HEADING_LEVELS[tag.name])
+            else:
+                document_lines.append(text)
+                current['paragraphs'].append(text)
+
+            previous_tag = tag.name
+
+        if current['heading'] or current['paragraphs'] or current['list_items']:
+            sections.append(current)
+
+        formatted_document = "\n".join(document_lines)
+        return formatted_document, sections
+
+    @staticmethod
+    def _inside_list_item(tag, container):
+        parent = tag.parent
+        while parent is not None and parent is not container:
+            if parent.name == "li":
+                return True
+            parent = parent.parent
+        return False
+
+    @classmethod
+    def _list_item_text(cls, tag):
+        """Như get_text(separator=" ", strip=True) nhưng bỏ qua các <ul>/<ol> lồng bên trong"""
+        parts = []
+        for child in tag.children:
+            if isinstance(child, Tag):
+                if child.name in NESTED_LIST_TAGS:
+                    continue
+                text = cls._list_item_text(child)
+            elif isinstance(child, NavigableString) and not isinstance(child, PreformattedString):
+                text = child.strip()
+            else:
+                continue  # comment, doctype...
+            if text:
+                parts.append(text)
+        return " ".join(parts)
+
+    @staticmethod
+    def _new_section(heading, level):
+        return {'heading': heading, 'level': level, 'paragraphs': [], 'list_items': []}
+
+
+def build_site_spider(site_name, module=__name__):
+    """Tạo class spider cho một site từ cấu hình (dùng cho site không có spider riêng)"""
+    site = get_site(site_name)
+    class_name = "".join(part.capitalize() for part in site.spider_name.split("_")) + "Spider"
+    return type(class_name, (HospitalSpider,), {
+        "name": site.spider_name,
+        "site_name": site.name,
+        "__module__": module,
+    })
@@ -0,0 +1,37 @@
+# Tự sinh spider cho các site trong SITES chưa có class spider riêng,
+# để `scrapy list` / `scrapy crawl <spider_name>` dùng được ngay.
+
+import importlib
+import pkgutil
+
+from hospital_crawler.sites import SITES
+from hospital_crawler.spiders.hospital import HospitalSpider, build_site_spider
+
+
+def _declared_sites():
+    """Site đã có class spider viết tay (mọi subclass của HospitalSpider trong package spiders)"""
+    package = __name__.rpartition(".")[0]
+    # Nạp hết các module spider trước để __subclasses__() thấy đủ class
+    for module in pkgutil.iter_modules(importlib.import_module(package).__path__):
+        if f"{package}.{module.name}" != __name__:
+            importlib.import_module(f"{package}.{module.name}")
+
+    sites = set()
+    pending = list(HospitalSpider.__subclasses__())
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        if cls.site_name and cls.__module__ != __name__:
+            sites.add(cls.site_name)
+    return sites
+
+
+_DECLARED_SITES = _declared_sites()
+
+# Chỉ gán vào globals theo tên class: Scrapy duyệt mọi giá trị của module,
+# biến tạm trỏ tới cùng class sẽ làm spider bị liệt kê hai lần
+globals().update(
+    (spider_cls.__name__, spider_cls)
+    for spider_cls in (build_site_spider(site_name, module=__name__)
+                       for site_name in SITES if site_name not in _DECLARED_SITES)
+)
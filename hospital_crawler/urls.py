@@ -0,0 +1,63 @@
+# Phân loại URL: category + slug
+#
+# Dùng chung cho spider và pipeline. Category/slug được tính một lần khi
+# parse sitemap, đi theo request.meta -> item, các bước sau không cần parse lại URL.
+
+import re
+from functools import lru_cache
+
+
+# Ký tự không hợp lệ cho tên folder / tên file trên Drive
+INVALID_FOLDER_CHARS = re.compile(r"[^a-zA-Z0-9_-]")
+INVALID_FILENAME_CHARS = re.compile(r"[^a-zA-Z0-9_.-]")
+
+UNKNOWN_CATEGORY = "unknown"
+MAX_SLUG_LENGTH = 200  # Google Drive limit ~255 chars
+CLASSIFY_CACHE_SIZE = 8192
+
+
+class UrlClassifier:
+    """
+    Phân loại URL theo category_rules của một site.
+    Pattern đã compile sẵn (SiteConfig.category_rules), kết quả được memo bằng LRU có giới hạn.
+    """
+
+    def __init__(self, category_rules, cache_size=CLASSIFY_CACHE_SIZE):
+        self.category_rules = category_rules
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, url):
+        return self._detect_category(url), self._detect_slug(url)
+
+    def category(self, url):
+        return self.classify(url)[0]
+
+    def slug(self, url):
+        return self.classify(url)[1]
+
+    def cache_info(self):
+        return self.classify.cache_info()
+
+    def _detect_category(self, url):
+        """Lấy category từ URL"""
+        # Ví dụ: https://tamanhhospital.vn/benh/abc -> category = "benh"
+        for pattern, category in self.category_rules:
+            match = pattern.search(url)
+            if match:
+                # Loại bỏ các ký tự đặc biệt trong tên folder
+                return INVALID_FOLDER_CHARS.sub("_", category or match.group(1))
+        return UNKNOWN_CATEGORY
+
+    def _detect_slug(self, url):
+        """Lấy slug từ URL"""
+        # Lấy phần cuối cùng của URL làm slug
+        slug = url.rstrip("/").split("/")[-1]
+        # Loại bỏ các ký tự không hợp lệ cho tên file
+        slug = INVALID_FILENAME_CHARS.sub("_", slug)
+
+        # Xử lý trường hợp slug rỗng hoặc chỉ có extension
+        if not slug or slug.startswith('.'):
+            slug = "index"
+
+        # Giới hạn độ dài filename
+        return slug[:MAX_SLUG_LENGTH]